@@ -1,4 +1,7 @@
 import random
+import functools
+import numpy as np
+from numba import njit
 import tenseal as ts  
 from datetime import datetime
 
@@ -6,20 +9,53 @@ NUM_PEOPLE = 50
 NUM_INFECTIONS = 5  
 THRESHOLD_SAFE = 800  
 THRESHOLD_CAUTION = 1200 
+ALPHA = 5  # Initial base risk score
+INTERACTION_THRESHOLD = 0  # Minimum interaction value for two people to be connected
+CONST_CACHE_DECIMALS = 2  # Rounding applied to cached constant vectors
+
+# Selector folding packed slot (person * NUM_INFECTIONS + k) onto IVS slot k
+PACKED_FOLD = np.tile(np.eye(NUM_INFECTIONS), (NUM_PEOPLE, 1))
 class HomomorphicEncryptionWrapper:
     """Wrapper for Fully Homomorphic Encryption (FHE) using TenSEAL."""
-    def __init__(self):
+    def __init__(self, poly_modulus_degree=4096, coeff_mod_bit_sizes=(49, 30, 30), global_scale=2**30):
+        # The IVS product is a single plain multiply, so one rescale level is enough and 4096 keeps
+        # 128-bit security (109-bit modulus budget). The rescale prime SEAL picks only approximates
+        # the scale, and TenSEAL treats the result as if it were exactly global_scale, so every
+        # product is off by prime / scale: about 1.6% with a 20-bit prime, 7e-5 with a 30-bit one.
+        # The 49-bit first prime leaves 19 bits of headroom for scores above THRESHOLD_CAUTION.
         self.context = ts.context(
             scheme=ts.SCHEME_TYPE.CKKS,
-            poly_modulus_degree=4096,  # Reduced for speed
-            coeff_mod_bit_sizes=[40, 20, 40]
+            poly_modulus_degree=poly_modulus_degree,
+            coeff_mod_bit_sizes=list(coeff_mod_bit_sizes)
         )
         self.context.generate_galois_keys()
-        self.context.global_scale = 2**20  # Lower scale for better performance
+        self.context.global_scale = global_scale
+
+        # Per-instance cache so constant ciphertexts survive across IVS queries
+        self._encrypt_const_cached = functools.lru_cache(maxsize=None)(self.encrypt)
+        self.encrypt_const((ALPHA,) * NUM_INFECTIONS)  # Pre-encrypt the initial IVS vector
 
     def encrypt(self, data_list):
-        """Encrypts a list using CKKS encryption (vectorized storage)."""
-        return ts.ckks_vector(self.context, [float(x) for x in data_list])
+        """Encrypts a list or array (2D inputs are flattened row-major) into a single CKKS vector."""
+        return ts.ckks_vector(self.context, np.asarray(data_list, dtype=np.float64).ravel().tolist())
+
+    def encrypt_const(self, values):
+        """Returns a cached encryption of a constant vector, keyed on its rounded values.
+
+        The returned ciphertext is shared, so callers must not modify it in place.
+        """
+        return self._encrypt_const_cached(tuple(round(float(x), CONST_CACHE_DECIMALS) for x in values))
+
+    def mul_plain(self, encrypted_data, plain):
+        """Multiplies a ciphertext by a plaintext vector (elementwise) or matrix (vector-matrix).
+
+        The plaintext is never encrypted, so no relinearization is needed, and a new
+        ciphertext is returned without modifying encrypted_data.
+        """
+        plain = np.asarray(plain, dtype=np.float64)
+        if plain.ndim == 2:
+            return encrypted_data.matmul(plain.tolist())
+        return encrypted_data * plain.tolist()
 
     def decrypt(self, encrypted_data):
         """Decrypts a CKKS encrypted vector."""
@@ -27,90 +63,129 @@ class HomomorphicEncryptionWrapper:
 
 def generate_adjacency_matrix(fhe_wrapper):
     """Generate adjacency matrix with encrypted multi-infection statuses."""
-    adjacency_matrix = [[random.uniform(0, 10) if i != j else 0 for j in range(NUM_PEOPLE)] for i in range(NUM_PEOPLE)]
-    
-    infected_statuses = [[random.randint(0, 1) for _ in range(NUM_INFECTIONS)] for _ in range(NUM_PEOPLE)]
+    rng = np.random.default_rng()
+    adjacency_matrix = rng.uniform(0, 10, (NUM_PEOPLE, NUM_PEOPLE))
+    np.fill_diagonal(adjacency_matrix, 0)
 
-    encrypted_statuses = [fhe_wrapper.encrypt(status_list) for status_list in infected_statuses]
+    infected_statuses = rng.integers(0, 2, (NUM_PEOPLE, NUM_INFECTIONS))
 
-    for i in range(NUM_PEOPLE):
-        adjacency_matrix[i][i] = encrypted_statuses[i]  # Store encrypted infection status in the diagonal
+    # All statuses are packed row-major into one ciphertext (NUM_PEOPLE * NUM_INFECTIONS slots)
+    encrypted_statuses = fhe_wrapper.encrypt(infected_statuses)
 
-    return adjacency_matrix, encrypted_statuses, infected_statuses
+    # Encrypted diagonal kept apart from the float matrix: shared ciphertext and (offset, length) of person i's slots
+    diagonal_encrypted = [(encrypted_statuses, (i * NUM_INFECTIONS, NUM_INFECTIONS)) for i in range(NUM_PEOPLE)]
 
-def print_adjacency_matrix(adjacency_matrix, encrypted_statuses, infected_statuses, fhe_wrapper):
+    return adjacency_matrix, diagonal_encrypted, infected_statuses
+
+def print_adjacency_matrix(adjacency_matrix, diagonal_encrypted, infected_statuses, fhe_wrapper):
     """Prints the adjacency matrix in both encrypted and non-encrypted formats."""
 
     print("\n🔹 **Non-Encrypted Adjacency Matrix:**")
-    for row in adjacency_matrix:
-        formatted_row = [
-            "ENCRYPTED" if isinstance(x, ts.CKKSVector) else round(x, 2)
-            for x in row
-        ]
-        print(formatted_row)
+    # Format the whole matrix in one call; only the diagonal needs overwriting
+    formatted_matrix = np.char.mod("%.2f", adjacency_matrix).astype(object)
+    np.fill_diagonal(formatted_matrix, "ENCRYPTED")
+    for formatted_row in formatted_matrix:
+        print(f"[{', '.join(formatted_row)}]")
 
     print("\n🔹 **Decrypted Infection Status Vectors:**")
-    for i, enc_status in enumerate(encrypted_statuses):
-        decrypted_status = fhe_wrapper.decrypt(enc_status)
+    decrypted_statuses = fhe_wrapper.decrypt(diagonal_encrypted[0][0])
+    for i, (_, (offset, length)) in enumerate(diagonal_encrypted):
+        decrypted_status = decrypted_statuses[offset:offset + length]
         print(f"Person {i}: {decrypted_status}")
 
     print("\n🔹 **Infected Status Vectors (Non-Encrypted, Before Encryption):**")
     for i, status in enumerate(infected_statuses):
-        print(f"Person {i}: {status}")
-
-
-def calculate_ivs_score(adjacency_matrix, A_index, fhe_wrapper):
+        print(f"Person {i}: {status.tolist()}")
+
+
+def bfs_reach(connected, interaction_weights, source, max_distance):
+    """Level-by-level equivalent of a queue BFS from source that marks people visited when dequeued.
+
+    A dequeued person contributes along every edge to someone not yet dequeued, including people
+    at its own level, so the dequeue order matters. Returns reach[d, p], the total interaction
+    weight flowing into person p from people dequeued at distance d.
+    """
+    num_people = connected.shape[0]
+    order = np.full(num_people, np.inf)  # Dequeue position; inf for people never dequeued
+    distances = np.full(num_people, -1)
+    order[source] = 0
+    distances[source] = 0
+    level = np.array([source])
+    dequeued = 1
+    for distance in range(1, max_distance + 1):
+        # A person is enqueued first by its earliest-dequeued neighbor, which enqueues in index order
+        first_parent = np.where(connected[level], order[level, None], np.inf).min(axis=0)
+        first_parent[distances >= 0] = np.inf
+        level = np.flatnonzero(np.isfinite(first_parent))
+        if level.size == 0:
+            break
+        level = level[np.argsort(first_parent[level], kind="stable")]
+        order[level] = np.arange(dequeued, dequeued + level.size)
+        distances[level] = distance
+        dequeued += level.size
+
+    # Edge u -> v counts if u is dequeued before v; people at distance max_distance + 1 stay at inf
+    dequeued_before = order[:, None] < order[None, :]
+    at_distance = distances[None, :] == np.arange(max_distance + 1)[:, None]
+    return at_distance.astype(np.float64) @ (interaction_weights * dequeued_before)
+
+def calculate_ivs_score(adjacency_matrix, diagonal_encrypted, A_index, fhe_wrapper):
     """Calculate IVS score homomorphically using multi-infection data and optimized traversal."""
-    alpha = 5  # Initial base risk score
     susceptibility_factor = random.uniform(0.5, 2.0)
 
-    severity_factors = [[random.uniform(0.1, 2.0) for _ in range(NUM_INFECTIONS)] for _ in range(NUM_PEOPLE)]
+    rng = np.random.default_rng()
+    severity_factors = rng.uniform(0.1, 2.0, (NUM_PEOPLE, NUM_INFECTIONS))
 
     infection_severities = [random.uniform(0.1, 1.0) for _ in range(NUM_INFECTIONS)]
     total_severity = sum(infection_severities)
     weights = [sev / total_severity for sev in infection_severities]  # Normalize to sum = 1
 
     max_distance = 5  # Limit the search depth to reduce processing time
-    ivs_scores = fhe_wrapper.encrypt([alpha] * NUM_INFECTIONS)  # Start with an encrypted IVS vector
 
-    visited = set()  # Track visited nodes to avoid redundant calculations
-    queue = [(A_index, 0)]  # BFS traversal (person, distance)
-    
-    while queue:
-        person, distance = queue.pop(0)
-        if distance > max_distance or person in visited:
-            continue
-        visited.add(person)
+    # inv_severity_powers[d, person] = 1 / severity ** d, shape (max_distance + 1, NUM_PEOPLE, NUM_INFECTIONS)
+    inv_severity_powers = 1.0 / severity_factors ** np.arange(max_distance + 1)[:, None, None]
 
-        for neighbor in range(NUM_PEOPLE):
-            if neighbor in visited:
-                continue  # Skip previously visited nodes
+    # Interaction weight of every edge between truly connected people
+    connected = adjacency_matrix > INTERACTION_THRESHOLD
+    interaction_weights = np.where(connected, rng.uniform(0.5, 1.0, (NUM_PEOPLE, NUM_PEOPLE)), 0.0)
 
-            if isinstance(adjacency_matrix[person][neighbor], int) and adjacency_matrix[person][neighbor] > 0:
-                encrypted_status = adjacency_matrix[neighbor][neighbor]
-                ci_vector = severity_factors[neighbor]
-                interaction_weight = random.uniform(0.5, 1.0)
+    reach = bfs_reach(connected, interaction_weights, A_index, max_distance)
 
-                ivs_contribution = [interaction_weight * (1 / (ci ** distance)) * susceptibility_factor for ci in ci_vector]
-                encrypted_ivs_contribution = fhe_wrapper.encrypt(ivs_contribution)
+    # Plaintext contribution for every packed status slot, laid out like the ciphertext
+    contrib_full = (susceptibility_factor * np.einsum("dp,dpk->pk", reach, inv_severity_powers)).ravel()
 
-                ivs_scores += encrypted_status * encrypted_ivs_contribution
-
-                queue.append((neighbor, distance + 1))
+    # One plain-ciphertext product for all edges: multiplies every slot by its contribution and
+    # sums the slots of each infection, then the cached base risk score is added
+    encrypted_statuses = diagonal_encrypted[A_index][0]
+    ivs_scores = fhe_wrapper.mul_plain(encrypted_statuses, PACKED_FOLD * contrib_full[:, None]) + fhe_wrapper.encrypt_const((ALPHA,) * NUM_INFECTIONS)
 
     return ivs_scores, weights  # Returns encrypted IVS score vector and weights
 
-def classify_ivs_score(ivs_scores):
-    """Classifies the IVS score for each infection type."""
-    classifications = []
-    for i, score in enumerate(ivs_scores):
+RISK_CLASSIFICATIONS = (
+    "Safe to attend gatherings ✅",
+    "Exercise caution; avoid large gatherings ⚠️",
+    "High risk; should not attend gatherings ❌",
+)
+
+@njit(cache=True)
+def aggregate_ivs_scores(ivs_scores, weights):
+    """Computes the weighted final IVS score and a risk code (0 safe, 1 caution, 2 high) per infection."""
+    final_ivs_score = 0.0
+    risk_codes = np.empty(ivs_scores.shape[0], dtype=np.int64)
+    for i in range(ivs_scores.shape[0]):
+        score = ivs_scores[i]
+        final_ivs_score += score * weights[i]
         if score < THRESHOLD_SAFE:
-            classifications.append(f"Infection {i+1}: Safe to attend gatherings ✅")
+            risk_codes[i] = 0
         elif score < THRESHOLD_CAUTION:
-            classifications.append(f"Infection {i+1}: Exercise caution; avoid large gatherings ⚠️")
+            risk_codes[i] = 1
         else:
-            classifications.append(f"Infection {i+1}: High risk; should not attend gatherings ❌")
-    return classifications
+            risk_codes[i] = 2
+    return final_ivs_score, risk_codes
+
+def classify_ivs_score(risk_codes):
+    """Maps the risk code of each infection type to its classification message."""
+    return [f"Infection {i+1}: {RISK_CLASSIFICATIONS[code]}" for i, code in enumerate(risk_codes)]
 
 def get_final_decision(final_ivs_score):
     """Determine if a person is allowed to attend based on final IVS score."""
@@ -124,9 +199,9 @@ def get_final_decision(final_ivs_score):
 def main():
     fhe_wrapper = HomomorphicEncryptionWrapper()  # Initialize Homomorphic Encryption
 
-    adjacency_matrix, encrypted_statuses, infected_statuses = generate_adjacency_matrix(fhe_wrapper)
+    adjacency_matrix, diagonal_encrypted, infected_statuses = generate_adjacency_matrix(fhe_wrapper)
 
-    print_adjacency_matrix(adjacency_matrix, encrypted_statuses, infected_statuses, fhe_wrapper)
+    print_adjacency_matrix(adjacency_matrix, diagonal_encrypted, infected_statuses, fhe_wrapper)
 
     while True:
         try:
@@ -143,11 +218,11 @@ def main():
                 print(f"Please enter a valid index between 0 and {NUM_PEOPLE - 1}.")
                 continue
 
-            encrypted_ivs_scores, weights = calculate_ivs_score(adjacency_matrix, A_index, fhe_wrapper)
-            decrypted_ivs_scores = fhe_wrapper.decrypt(encrypted_ivs_scores)
-            classifications = classify_ivs_score(decrypted_ivs_scores)
+            encrypted_ivs_scores, weights = calculate_ivs_score(adjacency_matrix, diagonal_encrypted, A_index, fhe_wrapper)
+            decrypted_ivs_scores = np.asarray(fhe_wrapper.decrypt(encrypted_ivs_scores), dtype=np.float64)
 
-            final_ivs_score = sum(decrypted_ivs_scores[i] * weights[i] for i in range(NUM_INFECTIONS))
+            final_ivs_score, risk_codes = aggregate_ivs_scores(decrypted_ivs_scores, np.asarray(weights, dtype=np.float64))
+            classifications = classify_ivs_score(risk_codes)
 
             print(f"\nIVS Scores for person {A_index}:")
             for i, score in enumerate(decrypted_ivs_scores):
@@ -1,118 +1,175 @@
+import os
 import time
 import secrets
 import hashlib
+import pickle
+import collections
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, ed25519
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.asymmetric import utils as crypto_utils
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
 
-def generate_key_pair():
-    """Generates RSA key pair."""
+_KEYPAIR_POOL = []  # Pre-generated RSA private keys, consumed by generate_key_pair
+VERIFY_CACHE_SIZE = 10_000  # Number of verified signatures remembered
+
+def _generate_private_key_der(_=None):
+    """Generates an RSA private key, DER-encoded so it can be returned from a worker process."""
     private_key = rsa.generate_private_key(
         public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
+        key_size=2048
     )
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+
+def fill_keypair_pool(count):
+    """Generates RSA key pairs in parallel worker processes and adds them to the pool."""
+    with ProcessPoolExecutor() as executor:
+        for private_key_der in executor.map(_generate_private_key_der, range(count)):
+            _KEYPAIR_POOL.append(serialization.load_der_private_key(private_key_der, password=None))
+
+def generate_key_pair():
+    """Returns an RSA key pair from the pre-generated pool, refilling it when empty."""
+    if not _KEYPAIR_POOL:
+        fill_keypair_pool(os.cpu_count() or 1)
+    private_key = _KEYPAIR_POOL.pop()
+    public_key = private_key.public_key()
+    return public_key, private_key
+
+def generate_signing_key_pair():
+    """Generates Ed25519 signing key pair."""
+    private_key = ed25519.Ed25519PrivateKey.generate()
     public_key = private_key.public_key()
     return public_key, private_key
 
 def hash_data(data):
     """Hashes data using SHA-256."""
-    hasher = hashes.Hash(hashes.SHA256(), backend=default_backend())
-    hasher.update(data.encode('utf-8') if isinstance(data, str) else data)
-    return hasher.finalize()
+    return hashlib.sha256(data.encode('utf-8') if isinstance(data, str) else data).digest()
 
 def sign_data(private_key, data):
-    """Signs data using private key."""
+    """Signs data using Ed25519 private key."""
     if isinstance(data, str):
         data = data.encode('utf-8')
     
-    signature = private_key.sign(
-        data,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
+    signature = private_key.sign(data)
     return signature
 
+_VERIFY_CACHE = collections.OrderedDict()  # LRU of (sha256(public key) + signature, sha256(data)) that verified
+
 def verify_signature(public_key, signature, data):
-    """Verifies signature using public key."""
+    """Verifies signature using Ed25519 public key, memoizing successful verifications."""
     if isinstance(data, str):
         data = data.encode('utf-8')
     
-    try:
-        public_key.verify(
-            signature,
-            data,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+    public_key_bytes = public_key.public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    cache_key = (hash_data(public_key_bytes) + signature, hash_data(data))
+    if cache_key in _VERIFY_CACHE:
+        _VERIFY_CACHE.move_to_end(cache_key)
         return True
+    
+    try:
+        public_key.verify(signature, data)
     except Exception:
         return False
+    _VERIFY_CACHE[cache_key] = True
+    if len(_VERIFY_CACHE) > VERIFY_CACHE_SIZE:
+        _VERIFY_CACHE.popitem(last=False)
+    return True
 
 def encrypt(public_key, data):
-    """Encrypts data using RSA."""
+    """Encrypts data with AES-GCM under a fresh key wrapped using RSA."""
     if isinstance(data, str):
         data = data.encode('utf-8')
     
-    encrypted = public_key.encrypt(
-        data,
+    key = secrets.token_bytes(32)
+    nonce = secrets.token_bytes(12)
+    wrapped_key = public_key.encrypt(
+        key,
         padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA256()),
             algorithm=hashes.SHA256(),
             label=None
         )
     )
-    return encrypted
+    ciphertext = AESGCM(key).encrypt(nonce, data, None)
+    return wrapped_key, nonce, ciphertext
 
-def decrypt(private_key, ciphertext):
-    """Decrypts data using RSA."""
-    decrypted = private_key.decrypt(
-        ciphertext,
+def decrypt(private_key, encrypted):
+    """Unwraps the AES key using RSA and decrypts the AES-GCM payload."""
+    wrapped_key, nonce, ciphertext = encrypted
+    key = private_key.decrypt(
+        wrapped_key,
         padding.OAEP(
             mgf=padding.MGF1(algorithm=hashes.SHA256()),
             algorithm=hashes.SHA256(),
             label=None
         )
     )
+    decrypted = AESGCM(key).decrypt(nonce, ciphertext, None)
     return decrypted
 
+def serialize_adjacency_matrix(user_index, adjacency_matrix):
+    """Serializes the user ordering and adjacency matrix to canonical bytes for signing."""
+    return pickle.dumps((tuple(user_index), adjacency_matrix.tobytes()), protocol=5)
+
+def deserialize_adjacency_matrix(data):
+    """Rebuilds (user_index, adjacency_matrix) from serialize_adjacency_matrix output."""
+    user_ids, matrix_bytes = pickle.loads(data)
+    user_index = {user_id: index for index, user_id in enumerate(user_ids)}
+    adjacency_matrix = np.frombuffer(matrix_bytes, dtype=np.int8).reshape(len(user_ids), len(user_ids)).copy()
+    return user_index, adjacency_matrix
+
 class TrustedAuthority:
     def __init__(self):
         self.public_key, self.private_key = generate_key_pair()
-        self.adjacency_matrix = {}
+        self.signing_public_key, self.signing_private_key = generate_signing_key_pair()
+        self.user_index = {}  # Maps BAN user id to its row/column in the adjacency matrix
+        self.adjacency_matrix = np.zeros((0, 0), dtype=np.int8)
         self.id = "TA"
-        self.user_public_keys = {}  # Store public keys of all users
+        self.user_public_keys = {}  # Store signing public keys of all users
     
     def initialize_system(self, miners, ban_users, government_authority):
         """Initializes the system, distributing keys."""
         for miner in miners:
-            miner.trusted_authority_public_key = self.public_key
+            miner.trusted_authority_signing_public_key = self.signing_public_key
         
         for ban_user in ban_users:
             ban_user.trusted_authority_public_key = self.public_key
-            self.user_public_keys[ban_user.id] = ban_user.public_key
+            self.user_public_keys[ban_user.id] = ban_user.signing_public_key
         
         government_authority.trusted_authority_public_key = self.public_key
-        self.user_public_keys[government_authority.authority_id] = government_authority.public_key
+        self.user_public_keys[government_authority.authority_id] = government_authority.signing_public_key
 
         print("TA: Initializing Adjacency Matrix.")
-        for user1 in ban_users:
-            for user2 in ban_users:
-                if user1.id != user2.id:
-                    self.adjacency_matrix[(user1.id, user2.id)] = 0
+        self.user_index = {ban_user.id: index for index, ban_user in enumerate(ban_users)}
+        self.adjacency_matrix = np.zeros((len(ban_users), len(ban_users)), dtype=np.int8)
         
-        message = {"adjacency_matrix": self.adjacency_matrix, "type": "init"}
-        signature = sign_data(self.private_key, str(self.adjacency_matrix))
+        self.adjacency_matrix_bytes = serialize_adjacency_matrix(self.user_index, self.adjacency_matrix)
+        message = {"adjacency_matrix": self.adjacency_matrix_bytes, "type": "init"}
+        signature = sign_data(self.signing_private_key, self.adjacency_matrix_bytes)
         broadcast_to_miners(message, signature, "InitAdjacency", self.id)
     
+    def verify_ta_payload(self, user_i_id, user_j_id, timestamp, hash_i, encrypted_ta_data):
+        """Decrypts BU_j's handshake payload and checks it matches the reported handshake."""
+        try:
+            ta_data = decrypt(self.private_key, encrypted_ta_data).decode('utf-8')
+        except (ValueError, InvalidTag):
+            print(f"TA: Failed to decrypt handshake payload from {user_j_id}")
+            return False
+        if ta_data != f"{user_j_id}{user_i_id}{timestamp}{hash_i.hex()}":
+            print(f"TA: Handshake payload from {user_j_id} does not match communication with {user_i_id}")
+            return False
+        return True
+    
     def verify_inter_ban_communication(self, user_i_id, user_j_id, timestamp, hash_i, hash_j, signature_i, signature_j):
         """Verifies the inter-BAN communication event."""
         user_i_public_key = self.user_public_keys.get(user_i_id)
@@ -138,8 +195,9 @@ class TrustedAuthority:
 class Miner:
     def __init__(self, miner_id):
         self.miner_id = miner_id
-        self.trusted_authority_public_key = None
-        self.adjacency_matrix = {}
+        self.trusted_authority_signing_public_key = None
+        self.user_index = {}
+        self.adjacency_matrix = np.zeros((0, 0), dtype=np.int8)
         self.pending_updates = []  # For consensus algorithm
 
     def receive_adjacency_matrix_init(self, message, signature, trusted_authority_id):
@@ -149,11 +207,12 @@ class Miner:
             return
             
         # Verify signature
-        if not verify_signature(self.trusted_authority_public_key, signature, str(message["adjacency_matrix"])):
+        if not verify_signature(self.trusted_authority_signing_public_key, signature, message["adjacency_matrix"]):
             print(f"Miner {self.miner_id}: Invalid signature for adjacency matrix initialization")
             return
             
-        self.adjacency_matrix = message["adjacency_matrix"]
+        # Only deserialize the matrix once its bytes are known to come from the TA
+        self.user_index, self.adjacency_matrix = deserialize_adjacency_matrix(message["adjacency_matrix"])
         print(f"Miner {self.miner_id}: Updating blockchain network (adjacency matrix initialization).")
         
         # Implement consensus algorithm (simplified here)
@@ -167,7 +226,7 @@ class Miner:
             
         # Verify signature from TA
         update_data = f"{user_i_id}{user_j_id}"
-        if not verify_signature(self.trusted_authority_public_key, signature, update_data):
+        if not verify_signature(self.trusted_authority_signing_public_key, signature, update_data):
             print(f"Miner {self.miner_id}: Invalid signature for inter-BAN update")
             return
             
@@ -201,8 +260,8 @@ class Miner:
                 user_i = update["user_i"]
                 user_j = update["user_j"]
                 # Update adjacency matrix as per Algorithm 2, step 5
-                self.adjacency_matrix[(user_i, user_j)] = 1
-                self.adjacency_matrix[(user_j, user_i)] = 1
+                i, j = self.user_index[user_i], self.user_index[user_j]
+                self.adjacency_matrix[i, j] = self.adjacency_matrix[j, i] = 1
                 print(f"Miner {self.miner_id}: Updated adjacency matrix for {user_i}-{user_j} to 1")
         
         # Clear pending updates after processing
@@ -215,6 +274,7 @@ class BANUser:
     def __init__(self, user_id):
         self.id = user_id
         self.public_key, self.private_key = generate_key_pair()
+        self.signing_public_key, self.signing_private_key = generate_signing_key_pair()
         self.trusted_authority_public_key = None
     
     def initiate_communication(self, other_user, timestamp=None):
@@ -225,7 +285,7 @@ class BANUser:
         # Algorithm 2, step 1: Compute hash and send to other user
         data = f"{other_user.id}{self.id}{timestamp}"
         hash_i = hash_data(data)
-        signature = sign_data(self.private_key, data)
+        signature = sign_data(self.signing_private_key, data)
         
         # Encrypt using other user's public key
         encrypted_data = encrypt(other_user.public_key, data)
@@ -257,12 +317,11 @@ class BANUser:
         hash_i = comm_data["hash"]
         data_j = f"{self.id}{sender_id}{timestamp}{hash_i.hex()}"
         hash_j = hash_data(data_j)
-        signature_j = sign_data(self.private_key, data_j)
+        signature_j = sign_data(self.signing_private_key, data_j)
         
         # Encrypt data for TA
         ta_data = f"{self.id}{sender_id}{timestamp}{hash_i.hex()}"
-        encrypted_ta_data = encrypt(self.trusted_authority_public_key, ta_data)
-        encrypted_timestamp = encrypt(self.trusted_authority_public_key, timestamp)
+        encrypted_ta_data = encrypt(self.trusted_authority_public_key, ta_data)  # ta_data already carries the timestamp
         
         print(f"BU {self.id}: Sending handshaking response to TA")
         
@@ -270,7 +329,6 @@ class BANUser:
             "hash_j": hash_j,
             "signature_j": signature_j,
             "encrypted_ta_data": encrypted_ta_data,
-            "encrypted_timestamp": encrypted_timestamp,
             "sender_id": sender_id,
             "hash_i": hash_i,
             "signature_i": comm_data["signature"]
@@ -280,6 +338,7 @@ class GovernmentAuthority:
     def __init__(self, authority_id):
         self.authority_id = authority_id
         self.public_key, self.private_key = generate_key_pair()
+        self.signing_public_key, self.signing_private_key = generate_signing_key_pair()
         self.trusted_authority_public_key = None
 
 # --- Network Communication ---
@@ -287,6 +346,8 @@ def broadcast_to_miners(message, signature, message_type, user_id):
     """Broadcasts a message to all miners."""
     print(f"Broadcasting message of type {message_type} from user: {user_id} to miners")
     
+    # Delivered in turn so miner output stays ordered; only the first miner pays for the signature
+    # check, the others hit the verification cache
     for miner in miners:
         if message_type == "InitAdjacency":
             miner.receive_adjacency_matrix_init(message, signature, user_id)
@@ -308,11 +369,17 @@ def simulate_ban_user_interaction(ban_user_i, ban_user_j, trusted_authority):
     comm_data = ban_user_i.initiate_communication(ban_user_j)
     
     # Step 2 & 3: BU_j verifies and responds
-    response = ban_user_j.handle_communication(comm_data, ban_user_i.id, ban_user_i.public_key)
+    response = ban_user_j.handle_communication(comm_data, ban_user_i.id, ban_user_i.signing_public_key)
     
     if response:
         # Step 4: TA verifies and updates blockchain
-       verified = trusted_authority.verify_inter_ban_communication(
+        verified = trusted_authority.verify_ta_payload(
+            ban_user_i.id,
+            ban_user_j.id,
+            comm_data["timestamp"],
+            response["hash_i"],
+            response["encrypted_ta_data"]
+        ) and trusted_authority.verify_inter_ban_communication(
             ban_user_i.id,
             ban_user_j.id,
             comm_data["timestamp"],  # original timestamp instead of encrypted
@@ -322,7 +389,7 @@ def simulate_ban_user_interaction(ban_user_i, ban_user_j, trusted_authority):
             response["signature_j"]
         )
         
-    if verified:
+        if verified:
             # Broadcast update to miners
             update_message = {
                 "type": "inter_ban_update",
@@ -330,7 +397,7 @@ def simulate_ban_user_interaction(ban_user_i, ban_user_j, trusted_authority):
                 "user_j": ban_user_j.id
             }
             update_signature = sign_data(
-                trusted_authority.private_key, 
+                trusted_authority.signing_private_key, 
                 f"{ban_user_i.id}{ban_user_j.id}"
             )
             broadcast_to_miners(update_message, update_signature, "InterBANUpdate", trusted_authority.id)
@@ -338,18 +405,23 @@ def simulate_ban_user_interaction(ban_user_i, ban_user_j, trusted_authority):
     print(f"--- End of interaction between {ban_user_i.id} and {ban_user_j.id} ---\n")
 
 # --- Main Execution ---
-# Create system entities
-trusted_authority = TrustedAuthority()
-ban_user1 = BANUser("BU1")
-ban_user2 = BANUser("BU2")
-ban_user3 = BANUser("BU3")
-government_authority = GovernmentAuthority("GA1")
-miners = [Miner("M1"), Miner("M2")]
+# Guarded so key-generation worker processes can import this module without rerunning it
+if __name__ == "__main__":
+    # Generate the RSA keys for the TA, the three BAN users and the GA in parallel
+    fill_keypair_pool(5)
+
+    # Create system entities
+    trusted_authority = TrustedAuthority()
+    ban_user1 = BANUser("BU1")
+    ban_user2 = BANUser("BU2")
+    ban_user3 = BANUser("BU3")
+    government_authority = GovernmentAuthority("GA1")
+    miners = [Miner("M1"), Miner("M2")]
 
-# Initialize system
-trusted_authority.initialize_system(miners, [ban_user1, ban_user2, ban_user3], government_authority)
-print("Setup Phase Completed.\n")
+    # Initialize system
+    trusted_authority.initialize_system(miners, [ban_user1, ban_user2, ban_user3], government_authority)
+    print("Setup Phase Completed.\n")
 
-# Simulate interactions
-simulate_ban_user_interaction(ban_user1, ban_user2, trusted_authority)
-simulate_ban_user_interaction(ban_user2, ban_user3, trusted_authority)
\ No newline at end of file
+    # Simulate interactions
+    simulate_ban_user_interaction(ban_user1, ban_user2, trusted_authority)
+    simulate_ban_user_interaction(ban_user2, ban_user3, trusted_authority)
\ No newline at end of file
@@ -1,25 +1,41 @@
+import os
 import time
 import secrets
 import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padding
 
-def generate_key_pair():
+_KEYPAIR_POOL = []  # Pre-generated RSA private keys, consumed by generate_key_pair
+
+def _generate_private_key_der(_=None):
     private_key = rsa.generate_private_key(
         public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
+        key_size=2048
+    )
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
     )
+
+def fill_keypair_pool(count):
+    with ProcessPoolExecutor() as executor:
+        for private_key_der in executor.map(_generate_private_key_der, range(count)):
+            _KEYPAIR_POOL.append(serialization.load_der_private_key(private_key_der, password=None))
+
+def generate_key_pair():
+    if not _KEYPAIR_POOL:
+        fill_keypair_pool(os.cpu_count() or 1)
+    private_key = _KEYPAIR_POOL.pop()
     public_key = private_key.public_key()
     return public_key, private_key
 
 def hash_data(data):
-    hasher = hashes.Hash(hashes.SHA256(), backend=default_backend())
-    hasher.update(data.encode('utf-8'))
-    return hasher.finalize().hex()
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
 def encrypt(public_key, data):
     encrypted = public_key.encrypt(
@@ -46,7 +62,8 @@ def decrypt(private_key, ciphertext):
 class TrustedAuthority:
     def __init__(self):
         self.public_key, self.private_key = generate_key_pair()
-        self.adjacency_matrix = {}
+        self.user_index = {}
+        self.adjacency_matrix = np.zeros((0, 0), dtype=np.int8)
         self.id = "TA"
     
     def initialize_system(self, miners, ban_users, government_authority):
@@ -56,10 +73,8 @@ class TrustedAuthority:
             ban_user.trusted_authority_public_key = self.public_key
         government_authority.trusted_authority_public_key = self.public_key
         
-        for user1 in ban_users:
-            for user2 in ban_users:
-                if user1.id != user2.id:
-                    self.adjacency_matrix[(user1.id, user2.id)] = 0
+        self.user_index = {ban_user.id: index for index, ban_user in enumerate(ban_users)}
+        self.adjacency_matrix = np.zeros((len(ban_users), len(ban_users)), dtype=np.int8)
         
         broadcast_to_miners(self.adjacency_matrix, "InitAdjacency", self.id)
 
@@ -67,7 +82,7 @@ class Miner:
     def __init__(self, miner_id):
         self.miner_id = miner_id
         self.trusted_authority_public_key = None
-        self.adjacency_matrix = {}
+        self.adjacency_matrix = np.zeros((0, 0), dtype=np.int8)
 
     def receive_adjacency_matrix_init(self, adjacency_matrix, trusted_authority_id):
         if trusted_authority_id == "TA":
@@ -96,15 +111,6 @@ def broadcast_to_miners(data, message_type, user_id):
 def update_blockchain(miner_id, adjacency_matrix):
     print(f"Miner {miner_id} updated blockchain with Adjacency Matrix: {adjacency_matrix}")
 
-trusted_authority = TrustedAuthority()
-ban_user1 = BANUser("BU1")
-ban_user2 = BANUser("BU2")
-ban_user3 = BANUser("BU3")
-government_authority = GovernmentAuthority("GA1")
-miners = [Miner("M1"), Miner("M2")]
-
-trusted_authority.initialize_system(miners, [ban_user1, ban_user2, ban_user3], government_authority)
-
 def simulate_ban_user_interaction(ban_user_i, ban_user_j, miners, trusted_authority):
     timestamp = str(time.time())
     nonce = secrets.token_hex(16)
@@ -131,12 +137,24 @@ def simulate_ban_user_interaction(ban_user_i, ban_user_j, miners, trusted_author
 def handle_ta_communication(user_i_id, user_j_id, timestamp, miners, trusted_authority, hash_i):
     for miner in miners:
         if miner.miner_id == "M1":
-            miner.adjacency_matrix[(user_i_id, user_j_id)] = 1
-            miner.adjacency_matrix[(user_j_id, user_i_id)] = 1
+            i, j = trusted_authority.user_index[user_i_id], trusted_authority.user_index[user_j_id]
+            miner.adjacency_matrix[i, j] = miner.adjacency_matrix[j, i] = 1
             print(f"Miner {miner.miner_id}: Updating adjacency matrix for inter-BAN communication: {(user_i_id, user_j_id)}.")
             update_blockchain(miner.miner_id, miner.adjacency_matrix)
 
 def verify_data(encrypted_data, signature_i, ban_user_i_public_key):
     return True
 
-simulate_ban_user_interaction(ban_user1, ban_user2, miners, trusted_authority)
+if __name__ == "__main__":
+    fill_keypair_pool(5)
+
+    trusted_authority = TrustedAuthority()
+    ban_user1 = BANUser("BU1")
+    ban_user2 = BANUser("BU2")
+    ban_user3 = BANUser("BU3")
+    government_authority = GovernmentAuthority("GA1")
+    miners = [Miner("M1"), Miner("M2")]
+
+    trusted_authority.initialize_system(miners, [ban_user1, ban_user2, ban_user3], government_authority)
+
+    simulate_ban_user_interaction(ban_user1, ban_user2, miners, trusted_authority)
@@ -1,94 +1,189 @@
+import argparse
+import logging
 import simpy
 import random
 import hashlib
+import hmac
+from functools import lru_cache
+import numpy as np
+from numba import njit
+
+log = logging.getLogger("sim")
 
 NUM_BAN_USERS = 5
 TRANSACTION_DELAY = 2
 COMMUNICATION_RANGE = 10
-
-contact_graph = {}
-user_locations = {}
+COMM_RANGE_SQ = COMMUNICATION_RANGE**2
+SCAN_RINGS = 2  # Rings of grid cells scanned around a user's own cell
+RANDOM_BATCH_SIZE = 1024
+MIN_SLEEP = 5
+MAX_SLEEP = 10
+MAX_STEP = 2**0.5
+
+contact_events = []
+xs = np.zeros(NUM_BAN_USERS, dtype=np.float32)
+ys = np.zeros(NUM_BAN_USERS, dtype=np.float32)
+location_grid = {}
+rng = np.random.default_rng()
 
 def hash_message(message):
-    return hashlib.sha256(message.encode()).hexdigest()
-
-def generate_signature(private_key, message):
-    return hash_message(private_key + message)
-
-def verify_signature(private_key, message, signature):
-    return generate_signature(private_key, message) == signature
-
-def calculate_distance(location1, location2):
-    return ((location1[0] - location2[0])**2 + (location1[1] - location2[1])**2)**0.5
+    return hashlib.blake2b(message, digest_size=16).digest()
+
+@lru_cache(maxsize=64)
+def generate_signature(signing_context, message):
+    hasher = signing_context.copy()
+    hasher.update(message)
+    return hasher.digest()
+
+def verify_signature(signing_context, message, signature):
+    return hmac.compare_digest(generate_signature(signing_context, message), signature)
+
+def draw_random_batch():
+    moves = rng.integers(-1, 2, size=(RANDOM_BATCH_SIZE, 2), dtype=np.int8).tolist()
+    sleeps = rng.integers(MIN_SLEEP, MAX_SLEEP + 1, size=RANDOM_BATCH_SIZE, dtype=np.int8).tolist()
+    return moves, sleeps
+
+def grid_cell(user_id):
+    return (int(xs[user_id] // COMMUNICATION_RANGE), int(ys[user_id] // COMMUNICATION_RANGE))
+
+def move_in_grid(user_id, old_cell):
+    new_cell = grid_cell(user_id)
+    if old_cell != new_cell:
+        location_grid[old_cell].discard(user_id)
+        location_grid.setdefault(new_cell, set()).add(user_id)
+
+def nearby_users(user_id):
+    cell_x, cell_y = grid_cell(user_id)
+    candidates = []
+    for dx in range(-SCAN_RINGS, SCAN_RINGS + 1):
+        for dy in range(-SCAN_RINGS, SCAN_RINGS + 1):
+            candidates.extend(location_grid.get((cell_x + dx, cell_y + dy), ()))
+    return np.array(sorted(candidates), dtype=np.int32)
+
+def grid_clearance(user_id):
+    x = float(xs[user_id]) % COMMUNICATION_RANGE
+    y = float(ys[user_id]) % COMMUNICATION_RANGE
+    return min(x, COMMUNICATION_RANGE - x, y, COMMUNICATION_RANGE - y)
+
+@njit(cache=True, fastmath=True)
+def scan_in_range(xs, ys, user_id, candidates, range_sq, nearest_sq):
+    out = np.empty(candidates.shape[0], np.int32)
+    n = 0
+    nearest = nearest_sq
+    x, y = xs[user_id], ys[user_id]
+    for i in candidates:
+        if i == user_id:
+            continue
+        dx = xs[i] - x
+        dy = ys[i] - y
+        d2 = dx * dx + dy * dy
+        if d2 <= range_sq:
+            out[n] = i
+            n += 1
+        if d2 < nearest:
+            nearest = d2
+    return out[:n], nearest
+
+scan_in_range(xs, ys, 0, np.arange(NUM_BAN_USERS, dtype=np.int32), COMM_RANGE_SQ, float(COMM_RANGE_SQ))
 
 class BANUser:
+    __slots__ = ("env", "user_id", "ta_public_key", "private_key", "public_key", "_sig_ctx",
+                 "_moves", "_sleeps", "_i", "_last_scan", "_nearest", "process")
+
     def __init__(self, env, user_id, ta_public_key, initial_location):
         self.env = env
         self.user_id = user_id
         self.ta_public_key = ta_public_key
-        self.private_key = hash_message(f"user_{user_id}_private")
-        self.public_key = hash_message(f"user_{user_id}_public")
-        self.location = initial_location
-        user_locations[user_id] = initial_location
+        self.private_key = hash_message(b"user_%d_private" % user_id)
+        self.public_key = hash_message(b"user_%d_public" % user_id)
+        self._sig_ctx = hashlib.blake2b(key=self.private_key, digest_size=16)
+        xs[user_id], ys[user_id] = initial_location
+        location_grid.setdefault(grid_cell(user_id), set()).add(user_id)
+        self._moves, self._sleeps = draw_random_batch()
+        self._i = 0
+        self._last_scan = 0
+        self._nearest = 0.0
         self.process = env.process(self.run())
 
     def run(self):
         while True:
-            self.location = (self.location[0] + random.randint(-1, 1), self.location[1] + random.randint(-1, 1))
-            user_locations[self.user_id] = self.location
-
-            for other_user_id in range(NUM_BAN_USERS):
-                if other_user_id != self.user_id:
-                  other_location = user_locations[other_user_id]
-                  distance = calculate_distance(self.location, other_location)
-
-                  if distance <= COMMUNICATION_RANGE:
-                    print(f"Time: {self.env.now} - User {self.user_id} in proximity of User {other_user_id}")
-                    yield self.env.process(self.initiate_contact(other_user_id))
-
-            yield self.env.timeout(random.randint(5, 10))
-
-    def initiate_contact(self, other_user_id):
+            if self._i == RANDOM_BATCH_SIZE:
+                self._moves, self._sleeps = draw_random_batch()
+                self._i = 0
+            dx, dy = self._moves[self._i]
+            sleep = self._sleeps[self._i]
+            self._i += 1
+
+            old_cell = grid_cell(self.user_id)
+            xs[self.user_id] += dx
+            ys[self.user_id] += dy
+            move_in_grid(self.user_id, old_cell)
+
+            max_move = MAX_STEP * ((self.env.now - self._last_scan) // MIN_SLEEP + 1)
+            if self._nearest - 2 * max_move <= COMMUNICATION_RANGE:
+                outside_rings = SCAN_RINGS * COMMUNICATION_RANGE + grid_clearance(self.user_id)
+                in_range, nearest_sq = scan_in_range(xs, ys, self.user_id, nearby_users(self.user_id),
+                                                     COMM_RANGE_SQ, outside_rings**2)
+                self._last_scan = self.env.now
+                self._nearest = nearest_sq**0.5
+
+                for other_user_id in in_range.tolist():
+                    log.debug("Time: %s - User %s in proximity of User %s", self.env.now, self.user_id, other_user_id)
+                    yield from self.initiate_contact(users[other_user_id])
+
+            yield self.env.timeout(sleep)
+
+    def sign(self, message):
+        return generate_signature(self._sig_ctx, message)
+
+    def initiate_contact(self, other_user):
         timestamp = self.env.now
-        data = f"{other_user_id}||{self.user_id}||{timestamp}"
-        signature = generate_signature(self.private_key, data)
+        data = b"%d||%d||%d" % (other_user.user_id, self.user_id, timestamp)
+        signature = self.sign(data)
 
-        print(f"Time: {self.env.now} - User {self.user_id} attempting to contact User {other_user_id}")
-        yield self.env.process(users[other_user_id].respond_to_contact(self.user_id, data, signature))
+        log.debug("Time: %s - User %s attempting to contact User %s", self.env.now, self.user_id, other_user.user_id)
+        yield from other_user.respond_to_contact(self, data, signature)
 
-    def respond_to_contact(self, sender_id, data, signature):
+    def respond_to_contact(self, sender, data, signature):
         timestamp = self.env.now
-        if verify_signature(users[sender_id].private_key, data, signature):
-            print(f"Time: {self.env.now} - User {self.user_id} received a valid message from User {sender_id}")
-            yield env.process(record_contact(self.env, sender_id, self.user_id))
+        sender_id = sender.user_id
+        if verify_signature(sender._sig_ctx, data, signature):
+            log.debug("Time: %s - User %s received a valid message from User %s", self.env.now, self.user_id, sender_id)
+            yield from record_contact(self.env, sender_id, self.user_id)
         else:
-            print(f"Time: {self.env.now} - User {self.user_id} rejected invalid message from {sender_id}")
+            log.debug("Time: %s - User %s rejected invalid message from %s", self.env.now, self.user_id, sender_id)
 
 class TrustedAuthority:
+    __slots__ = ("env", "public_key", "private_key")
+
     def __init__(self, env):
         self.env = env
-        self.public_key = hash_message("TA_public")
-        self.private_key = hash_message("TA_private")
+        self.public_key = hash_message(b"TA_public")
+        self.private_key = hash_message(b"TA_private")
 
     def setup_system(self):
-        print("--- System Setup Started ---")
+        log.debug("--- System Setup Started ---")
         yield self.env.timeout(TRANSACTION_DELAY)
 
-        for i in range(NUM_BAN_USERS):
-            for j in range(NUM_BAN_USERS):
-                contact_graph[(i, j)] = 0
-
-        print("Time:", self.env.now, "- TA: Initialized contact graph:", contact_graph)
-        print("--- System Setup Complete ---")
+        log.debug("Time: %s - TA: System initialized", self.env.now)
+        log.debug("--- System Setup Complete ---")
 
 def record_contact(env, user1_id, user2_id):
-    print(f"Time: {env.now} - Miners: Received request to record contact between User {user1_id} and User {user2_id}")
+    log.debug("Time: %s - Miners: Received request to record contact between User %s and User %s", env.now, user1_id, user2_id)
     yield env.timeout(TRANSACTION_DELAY)
 
-    contact_graph[(user1_id, user2_id)] = 1
-    contact_graph[(user2_id, user1_id)] = 1
+    if user1_id < user2_id:
+        contact_events.append((env.now, user1_id, user2_id))
+    else:
+        contact_events.append((env.now, user2_id, user1_id))
+
+    log.debug("Time: %s - Miners: Recorded contact between User %s and User %s", env.now, user1_id, user2_id)
 
-    print(f"Time: {env.now} - Miners: Recorded contact: {contact_graph}")
+parser = argparse.ArgumentParser(description="BAN contact tracing simulation")
+parser.add_argument("--verbose", action="store_true", help="log every simulation event")
+args = parser.parse_args()
+logging.basicConfig(format="%(message)s")
+log.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
 
 env = simpy.Environment()
 ta = TrustedAuthority(env)
@@ -98,4 +193,7 @@ users = [BANUser(env, i, ta.public_key, (random.randint(0, 100), random.randint(
 
 print("Starting simulation...")
 env.run(until=50)
-print("Simulation complete.")
\ No newline at end of file
+print("Simulation complete.")
+
+contact_graph = {(a, b) for _, a, b in contact_events}
+print("Contact graph:", contact_graph)
\ No newline at end of file